@@ -1,49 +1,248 @@
 import os
+import io
+import functools
+import atexit
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
+import orjson
 import pandas as pd
-from tools import ZipDownloader, Unzipper, CurrencyExtractor
+from tools import ZipDownloader, Unzipper, CurrencyTable, DataFrameCache, DataNotAvailable, extract
 import logging
-from flask import Flask, request, jsonify
+from logging.handlers import QueueHandler, QueueListener
+from flask import Flask, Response, request, jsonify
+from werkzeug.routing import BaseConverter
 
 load_dotenv()
 
+
+def start_log_listener() -> QueueListener:
+    """
+    Starts the thread that writes queued log records, so request threads never wait on the log file.
+    """
+
+    if os.getenv("LOG_FILE"):
+        handler = logging.FileHandler(os.getenv("LOG_FILE"))
+    else:
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(levelname)s - %(message)s'))
+
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+log_queue = queue.SimpleQueue()
+
+# records are formatted by the listener's handler, the queue only carries the message
+queue_handler = QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
 logging.basicConfig(
-    filename=os.getenv("LOG_FILE"),
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s')
+    handlers=[queue_handler])
+
+log_listener = start_log_listener()
+
+# threads do not survive a fork, so forked workers start their own listener
+os.register_at_fork(after_in_child=start_log_listener)
+
+
+class DateConverter(BaseConverter):
+    """
+    URL converter accepting only YYYY-MM-DD, so malformed dates are rejected by the router.
+    """
+
+    regex = r'\d{4}-\d{2}-\d{2}'
+
+
+# must fit gunicorn's limit_request_line (see gunicorn.conf.py): 400 percent-encoded pairs
+# like USD%3A2023-11-20%2C take 7600 characters
+MAX_BATCH_SIZE = 400
+
+# the ECB publishes new rates around 16:00 CET, refresh a bit after that
+REFRESH_TIMEZONE = ZoneInfo("Europe/Berlin")
+REFRESH_HOUR = 16
+REFRESH_MINUTE = 30
+REFRESH_JITTER = 300
+
+# failed refreshes are retried after 10, 20 and 40 minutes
+REFRESH_ATTEMPTS = 4
+REFRESH_RETRY_DELAY = 600
 
 app = Flask(__name__)
+app.url_map.converters['date'] = DateConverter
+
+
+def load_dataframe(zipped_data: io.BytesIO) -> pd.DataFrame:
+    """
+    Builds the currency DataFrame from the downloaded zip, reusing the Parquet cache when the zip is unchanged.
+    """
+
+    cache_key = DataFrameCache.key_for(zipped_data.getvalue())
+    df = cache.load(cache_key)
+    if df is not None:
+        return df
+
+    # create unzipper instance
+    unzipper = Unzipper(os.getenv("FILE_TO_EXTRACT"), zipped_data)
+
+    # create dataframe, parsing the currency columns straight to floats
+    data = unzipper.get_data()
+    columns = pd.read_csv(data, nrows=0).columns
+    data.seek(0)
+    dtype = {column: 'float64' for column in columns} | {'Date': 'string'}
+    df = pd.read_csv(data, dtype=dtype, na_values=['N/A'], engine='c')
+
+    # drop columns where all values = nan
+    df.dropna(axis=1, how='all', inplace=True)
+
+    # index by date so lookups are an index probe instead of a column scan
+    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
+    df = df.set_index('Date').sort_index()
+
+    cache.save(cache_key, df)
+    return df
 
 
 # create zipDownloader instance
 zip_downloader = ZipDownloader(os.getenv("ZIP_URL"))
 
-# create unzipper instance
-unzipper = Unzipper(os.getenv("FILE_TO_EXTRACT"), zip_downloader.get_file())
+# create cache instance
+cache = DataFrameCache(os.getenv("CACHE_DIR", "cache"))
 
-# create dataframe
-df = pd.read_csv(unzipper.get_data())
+class ServedData(NamedTuple):
+    """
+    The currency table being served, together with the memoized lookup for that table.
+    """
 
-# drop columns where all values = nan
-df.dropna(axis=1, how='all', inplace=True)
+    table: CurrencyTable
+    lookup: Callable[[str, str], bytes]
 
 
-@app.route("/<date>/<currency>", methods=['GET'])
-def endpoint(date, currency):
-    try:
-        # Create currency extractor instance
-        currency_extractor = CurrencyExtractor(date, currency, df)
-        result = currency_extractor.get_value()
+def serve(table: CurrencyTable) -> ServedData:
+    """
+    Wraps the table with its own memoized lookup, so the memo is freed together with the table.
+    """
+
+    @functools.lru_cache(maxsize=100_000)
+    def lookup(date: str, currency: str) -> bytes:
+        # memoized since a table never changes
+        return orjson.dumps(extract(date, currency, table))
+
+    return ServedData(table, lookup)
+
 
-        return jsonify(result)
+# create currency table instance, the DataFrame is only needed to build it
+served_data = serve(CurrencyTable(load_dataframe(zip_downloader.get_file())))
 
-    except BaseException:
+
+def seconds_until_refresh(now: datetime) -> float:
+    """
+    Returns the number of seconds from now until the next scheduled data refresh.
+    """
+
+    now = now.astimezone(REFRESH_TIMEZONE)
+    next_refresh = now.replace(
+        hour=REFRESH_HOUR, minute=REFRESH_MINUTE, second=0, microsecond=0)
+    if next_refresh <= now:
+        next_refresh += timedelta(days=1)
+
+    # compare timestamps, so a DST change in between is accounted for
+    return next_refresh.timestamp() - now.timestamp()
+
+
+def refresh_loop():
+    """
+    Reloads the currency data once a day and swaps in the new table.
+    Requests keep using whichever table they read at entry, so they never wait on the download,
+    and the old table is freed with its memo once they finish.
+    """
+
+    global served_data
+
+    while True:
+        # jitter per process, so the workers do not all download at the same second
+        delay = seconds_until_refresh(datetime.now(REFRESH_TIMEZONE))
+        time.sleep(delay + random.uniform(0, REFRESH_JITTER))
+
+        for attempt in range(1, REFRESH_ATTEMPTS + 1):
+            try:
+                served_data = serve(CurrencyTable(load_dataframe(zip_downloader.get_file())))
+                logging.info("Currency data refreshed")
+                break
+            except Exception:
+                logging.exception(
+                    f"Currency data refresh failed, attempt {attempt} of {REFRESH_ATTEMPTS}")
+
+            # back off before retrying, a transient error should not leave the data stale for a day
+            if attempt < REFRESH_ATTEMPTS:
+                time.sleep(REFRESH_RETRY_DELAY * 2 ** (attempt - 1))
+
+
+def start_refresh_thread():
+    """
+    Starts the refresh thread. Called from the gunicorn post_fork hook, so only processes serving requests refresh.
+    """
+
+    threading.Thread(target=refresh_loop, daemon=True).start()
+
+
+def error_response():
+    error = {
+        'error': 'Something wrong happend, please read the log for more information',
+    }
+
+    return jsonify(error), 404
+
+
+@app.errorhandler(404)
+def not_found(e):
+    # router rejections, e.g. malformed dates, never reach a handler that logs
+    logging.warning(f"Not found: {request.path}")
+    return error_response()
+
+
+@app.route("/batch", methods=['GET'])
+def batch():
+    pairs = []
+    for arg in request.args.getlist('pairs'):
+        for pair in filter(None, arg.split(',')):
+            currency, _, date = pair.partition(':')
+            pairs.append((currency, date))
+
+    if len(pairs) > MAX_BATCH_SIZE:
         error = {
-            'error': 'Something wrong happend, please read the log for more information',
+            'error': f'Too many pairs, at most {MAX_BATCH_SIZE} are allowed',
         }
 
-        return jsonify(error), 404
+        return jsonify(error), 400
+
+    table = served_data.table
+
+    return Response(orjson.dumps(table.get_values(pairs)), mimetype='application/json')
+
+
+@app.route("/<date:date>/<currency>", methods=['GET'])
+def endpoint(date, currency):
+    table, lookup = served_data
+
+    try:
+        body = lookup(date, currency)
+
+    except DataNotAvailable as e:
+        logging.warning(f"Request failed: {str(e)}")
+        return error_response()
 
+    response = Response(body, mimetype='application/json')
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    response.set_etag(f"{table.version}:{date}:{currency}")
 
-if __name__ == '__main__':
-    app.run()
+    return response.make_conditional(request)
@@ -0,0 +1,9 @@
+# gunicorn's maximum, so a full /batch request (MAX_BATCH_SIZE pairs) fits in the request line
+limit_request_line = 8190
+
+
+def post_fork(server, worker):
+    # only workers serve requests, so only they refresh the currency data
+    import currency_api
+
+    currency_api.start_refresh_thread()
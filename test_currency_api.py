@@ -0,0 +1,221 @@
+import pytest
+import io
+import os
+import sys
+import zipfile
+import weakref
+import requests
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+
+
+CSV = (
+    "Date,USD,JPY,CYP,SEK,\n"
+    "2023-11-10,1.0683,161.78,N/A,11.629,\n"
+    "2023-11-09,1.0691,161.42,N/A,11.6325,\n"
+    "2023-11-08,1.0684,161.01,N/A,N/A,\n"
+    "1999-01-04,1.1789,133.73,0.58231,9.4696,\n"
+)
+
+
+def zipped(csv):
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
+        zip_file.writestr('eurofxref-hist.csv', csv)
+
+    zip_buffer.seek(0)
+    return zip_buffer
+
+
+def mock_zip_response(csv):
+    mock_response = MagicMock(spec=requests.Response)
+    mock_response.status_code = 200
+    mock_response.raw = zipped(csv)
+    mock_response.__enter__.return_value = mock_response
+    return mock_response
+
+
+@pytest.fixture(scope='module')
+def currency_api(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('currency_api')
+    env = {
+        'ZIP_URL': 'http://whatever.com/file.zip',
+        'FILE_TO_EXTRACT': 'eurofxref-hist.csv',
+        'CACHE_DIR': str(tmp_path / 'cache'),
+        'LOG_FILE': str(tmp_path / 'currency_api.log'),
+    }
+
+    # The app reads its settings at import and on refresh, so the environment stays patched
+    with patch.dict(os.environ, env):
+        # Importing the app downloads the data, so the shared session is mocked first
+        with patch('tools._session.get', return_value=mock_zip_response(CSV)):
+            sys.modules.pop('currency_api', None)
+            import currency_api
+
+        yield currency_api
+
+
+@pytest.fixture
+def client(currency_api):
+    return currency_api.app.test_client()
+
+
+def test_endpoint_correct_result(client):
+    response = client.get('/2023-11-10/SEK')
+
+    assert response.status_code == 200
+    assert response.json == {'currency': 'SEK', 'date': '2023-11-10', 'value': 11.629}
+
+
+def test_endpoint_caching_headers(currency_api, client):
+    response = client.get('/2023-11-10/SEK')
+
+    assert response.headers['Cache-Control'] == 'public, max-age=86400'
+    assert response.headers['ETag'] == f'"{currency_api.served_data.table.version}:2023-11-10:SEK"'
+
+
+def test_endpoint_not_modified(client):
+    etag = client.get('/2023-11-10/SEK').headers['ETag']
+    response = client.get('/2023-11-10/SEK', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_endpoint_failed_lookup_not_cached(client):
+    response = client.get('/2023-11-11/SEK')
+
+    assert response.status_code == 404
+    assert 'Cache-Control' not in response.headers
+    assert 'ETag' not in response.headers
+
+
+@pytest.mark.parametrize('path', ['/2023-1-120/USD', '/abcd/USD'])
+def test_endpoint_malformed_date(client, caplog, path):
+    with caplog.at_level('WARNING'):
+        response = client.get(path)
+
+    assert response.status_code == 404
+    assert response.json == {
+        'error': 'Something wrong happend, please read the log for more information'}
+
+    # The router rejection is logged, as the error message promises
+    assert f"Not found: {path}" in caplog.text
+
+
+def test_batch_comma_separated_pairs(client):
+    response = client.get('/batch?pairs=SEK:2023-11-10,USD:2023-11-11,SEK:2023-11-08,XXX:2023-11-10')
+
+    assert response.status_code == 200
+    assert response.json == [
+        {'currency': 'SEK', 'date': '2023-11-10', 'value': 11.629},
+        {'currency': 'USD', 'date': '2023-11-11', 'error': 'Date not available: 2023-11-11'},
+        {'currency': 'SEK', 'date': '2023-11-08', 'error': 'Currency data not available: SEK, 2023-11-08'},
+        {'currency': 'XXX', 'date': '2023-11-10', 'error': 'Currency not available: XXX'},
+    ]
+
+
+def test_batch_repeated_pairs_parameter(client):
+    response = client.get('/batch?pairs=CYP:1999-01-04&pairs=USD:2023-11-09,')
+
+    assert response.json == [
+        {'currency': 'CYP', 'date': '1999-01-04', 'value': 0.58231},
+        {'currency': 'USD', 'date': '2023-11-09', 'value': 1.0691},
+    ]
+
+
+def test_batch_pair_without_colon(client):
+    response = client.get('/batch?pairs=USD')
+
+    assert response.json == [{'currency': 'USD', 'date': '', 'error': 'Date not available: '}]
+
+
+def test_batch_empty(client):
+    assert client.get('/batch').json == []
+
+
+def test_batch_too_many_pairs(currency_api, client):
+    pairs = ','.join(['USD:2023-11-10'] * (currency_api.MAX_BATCH_SIZE + 1))
+    response = client.get(f'/batch?pairs={pairs}')
+
+    assert response.status_code == 400
+    assert response.json == {
+        'error': f'Too many pairs, at most {currency_api.MAX_BATCH_SIZE} are allowed'}
+
+
+@pytest.mark.parametrize('now, hours', [
+    # before and after the refresh time on a regular day
+    (datetime(2026, 10, 14, 12, 0), 4.5),
+    (datetime(2026, 10, 14, 17, 0), 23.5),
+    # the night in between loses an hour in March and gains one in October
+    (datetime(2026, 3, 28, 17, 0), 22.5),
+    (datetime(2026, 10, 24, 17, 0), 24.5),
+])
+def test_seconds_until_refresh(currency_api, now, hours):
+    now = now.replace(tzinfo=currency_api.REFRESH_TIMEZONE)
+
+    assert currency_api.seconds_until_refresh(now) == hours * 3600
+
+
+class StopRefresh(Exception):
+    pass
+
+
+def run_refresh_loop(currency_api, get_file):
+    """
+    Runs one scheduled refresh with its retries and returns the retry delays.
+    The loop is stopped at the wait for the next scheduled refresh.
+    """
+
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) > currency_api.REFRESH_ATTEMPTS:
+            raise StopRefresh()
+
+    with patch('currency_api.time.sleep', side_effect=sleep), \
+            patch.object(currency_api.zip_downloader, 'get_file', get_file):
+        with pytest.raises(StopRefresh):
+            currency_api.refresh_loop()
+
+    # the first sleep waits for the schedule and the last one for the next day
+    return sleeps[1:-1]
+
+
+def test_refresh_loop_gives_up_and_keeps_table(currency_api, monkeypatch):
+    monkeypatch.setattr(currency_api, 'served_data', currency_api.served_data)
+    served_data = currency_api.served_data
+    get_file = MagicMock(side_effect=requests.ConnectionError('boom'))
+
+    retry_delays = run_refresh_loop(currency_api, get_file)
+
+    assert get_file.call_count == currency_api.REFRESH_ATTEMPTS
+    assert retry_delays == [600, 1200, 2400]
+    assert currency_api.served_data is served_data
+
+
+def test_refresh_loop_retries_and_swaps_table(currency_api, monkeypatch, client):
+    monkeypatch.setattr(currency_api, 'served_data', currency_api.served_data)
+    csv = "Date,USD,SEK,\n2023-11-13,1.07,11.7,\n2023-11-10,1.0683,11.629,\n"
+    get_file = MagicMock(side_effect=[requests.ConnectionError('boom'), zipped(csv)])
+
+    with patch('currency_api.time.sleep', side_effect=[None, None, StopRefresh()]):
+        with patch.object(currency_api.zip_downloader, 'get_file', get_file):
+            with pytest.raises(StopRefresh):
+                currency_api.refresh_loop()
+
+    assert get_file.call_count == 2
+    assert client.get('/2023-11-13/SEK').json == {'currency': 'SEK', 'date': '2023-11-13', 'value': 11.7}
+
+
+def test_served_lookup_does_not_keep_table_alive(currency_api):
+    table = currency_api.CurrencyTable(currency_api.load_dataframe(zipped(CSV)))
+    table_ref = weakref.ref(table)
+    lookup = currency_api.serve(table).lookup
+
+    # a request that read this table before a swap finishes after it
+    assert lookup('2023-11-10', 'SEK') == b'{"currency":"SEK","date":"2023-11-10","value":11.629}'
+
+    del table, lookup
+    assert table_ref() is None
@@ -4,19 +4,26 @@ import pandas as pd
 import numpy as np
 import requests
 import zipfile
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, MagicMock
 from requests.exceptions import HTTPError
-from tools import ZipDownloader, CurrencyExtractor, Unzipper
+from tools import (ZipDownloader, CurrencyExtractor, CurrencyTable, Unzipper, DataFrameCache, extract,
+                   CurrencyNotAvailable, DateNotAvailable, ValueNotAvailable)
+
+
+def mock_streamed_response(status_code, content):
+    mock_response = MagicMock(spec=requests.Response)
+    mock_response.status_code = status_code
+    mock_response.raw = io.BytesIO(content)
+    mock_response.__enter__.return_value = mock_response
+    return mock_response
 
 
 def test_zip_downloader_get_file_successful_download():
 
-    mock_response = Mock(spec=requests.Response)
-    mock_response.status_code = 200
-    mock_response.content = b'0123456789'
+    mock_response = mock_streamed_response(200, b'0123456789')
 
-    # Mock the requests.get method
-    with patch('tools.requests.get') as mock_get:
+    # Mock the shared session get method
+    with patch('tools._session.get') as mock_get:
         mock_get.return_value = mock_response
 
         zip_downloader = ZipDownloader('http://whatever.com/file.zip')
@@ -31,65 +38,156 @@ def test_zip_downloader_get_file_successful_download():
 
 def test_zip_downloader_get_file_http_error():
 
-    mock_response = Mock(spec=requests.Response)
-    mock_response.status_code = 404
-    mock_response.content = b'0123456789'
+    mock_response = mock_streamed_response(404, b'0123456789')
 
-    # Mock the requests.get method
-    with patch('tools.requests.get') as mock_get:
+    # Mock the shared session get method
+    with patch('tools._session.get') as mock_get:
         mock_get.return_value = mock_response
 
         with pytest.raises(HTTPError, match='HTTP error 404'):
             zip_downloader = ZipDownloader('http://whatever.com/file.zip')
             zip_downloader.get_file()
 
+        # The streamed response is closed, so its connection goes back to the pool
+        mock_response.__exit__.assert_called_once()
+
+
+def test_zip_downloader_uses_injected_session():
+
+    mock_response = mock_streamed_response(200, b'0123456789')
+
+    mock_session = Mock(spec=requests.Session)
+    mock_session.get.return_value = mock_response
+
+    zip_downloader = ZipDownloader('http://whatever.com/file.zip', mock_session)
+    zip_downloader.get_file()
+
+    mock_session.get.assert_called_once()
+
 
 @pytest.fixture
 def sample_dataframe():
     # Create sample dataframe
     data = {
         'Date': ['2023-11-20', '2023-11-21', '2023-11-22'],
-        'USD': ['3.1415', '1.4142', '2.7182'],
-        'SEK': ['6.6260', '9.1093', np.nan]
+        'USD': [3.1415, 1.4142, 2.7182],
+        'SEK': [6.6260, 9.1093, np.nan]
     }
-    return pd.DataFrame(data)
+    df = pd.DataFrame(data)
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df.set_index('Date').sort_index()
 
 
-def test_currency_extractor_correct_result(sample_dataframe):
+@pytest.fixture
+def sample_table(sample_dataframe):
+    return CurrencyTable(sample_dataframe)
+
+
+def test_currency_extractor_correct_result(sample_table):
     currency_extractor = CurrencyExtractor(
-        '2023-11-20', 'USD', sample_dataframe)
+        '2023-11-20', 'USD', sample_table)
     result = currency_extractor.get_value()
 
     assert result == {
         'currency': 'USD',
         'date': '2023-11-20',
-        'value': '3.1415'}
+        'value': 3.1415}
+
+
+def test_extract_correct_result(sample_table):
+    assert extract('2023-11-21', 'SEK', sample_table) == {
+        'currency': 'SEK',
+        'date': '2023-11-21',
+        'value': 9.1093}
 
 
-def test_currency_extractor_wrong_date(sample_dataframe):
+def test_currency_extractor_wrong_date(sample_table):
     currency_extractor = CurrencyExtractor(
-        '2023-11-19', 'USD', sample_dataframe)
+        '2023-11-19', 'USD', sample_table)
 
-    with pytest.raises(Exception, match="Date not available: 2023-11-19"):
+    with pytest.raises(DateNotAvailable, match="Date not available: 2023-11-19"):
         currency_extractor.get_value()
 
 
-def test_currency_extractor_wrong_currency(sample_dataframe):
+def test_currency_extractor_malformed_date(sample_table):
     currency_extractor = CurrencyExtractor(
-        '2023-11-20', 'ASD', sample_dataframe)
+        '2023-1-120', 'USD', sample_table)
 
-    with pytest.raises(Exception, match="Currency not available: ASD"):
+    with pytest.raises(DateNotAvailable, match="Date not available: 2023-1-120"):
         currency_extractor.get_value()
 
 
-def test_currency_extractor_nan_value(sample_dataframe):
+def test_currency_extractor_wrong_currency(sample_table):
     currency_extractor = CurrencyExtractor(
-        '2023-11-22', 'SEK', sample_dataframe)
+        '2023-11-20', 'ASD', sample_table)
 
-    with pytest.raises(Exception, match="Currency data not available: SEK, 2023-11-22"):
+    with pytest.raises(CurrencyNotAvailable, match="Currency not available: ASD"):
         currency_extractor.get_value()
 
 
+def test_currency_extractor_nan_value(sample_table):
+    currency_extractor = CurrencyExtractor(
+        '2023-11-22', 'SEK', sample_table)
+
+    with pytest.raises(ValueNotAvailable, match="Currency data not available: SEK, 2023-11-22"):
+        currency_extractor.get_value()
+
+
+def test_currency_table_get_values(sample_table):
+    result = sample_table.get_values([
+        ('USD', '2023-11-20'),
+        ('SEK', '2023-11-21'),
+        ('SEK', '2023-11-22'),
+        ('ASD', '2023-11-20'),
+        ('USD', '2023-11-19'),
+    ])
+
+    assert result == [
+        {'currency': 'USD', 'date': '2023-11-20', 'value': 3.1415},
+        {'currency': 'SEK', 'date': '2023-11-21', 'value': 9.1093},
+        {'currency': 'SEK', 'date': '2023-11-22',
+         'error': 'Currency data not available: SEK, 2023-11-22'},
+        {'currency': 'ASD', 'date': '2023-11-20',
+         'error': 'Currency not available: ASD'},
+        {'currency': 'USD', 'date': '2023-11-19',
+         'error': 'Date not available: 2023-11-19'},
+    ]
+
+
+def test_currency_table_sorts_dates(sample_dataframe):
+    table = CurrencyTable(sample_dataframe.iloc[::-1])
+
+    assert table.dates.tolist() == [20231120, 20231121, 20231122]
+    assert table.dates.flags['C_CONTIGUOUS'] and table.values.flags['C_CONTIGUOUS']
+    assert table.get_value('2023-11-20', 'USD') == 3.1415
+
+
+def test_currency_table_columns(sample_table):
+    assert sample_table.col_idx == {'USD': 0, 'SEK': 1}
+
+
+def test_currency_table_version(sample_dataframe, sample_table):
+    assert CurrencyTable(sample_dataframe.copy()).version == sample_table.version
+
+    revised = sample_dataframe.copy()
+    revised.iloc[0, 0] = 3.1416
+    assert CurrencyTable(revised).version != sample_table.version
+
+
+def test_currency_table_get_values_no_dates(sample_dataframe):
+    table = CurrencyTable(sample_dataframe.iloc[:0])
+
+    assert table.get_values([('USD', '2023-11-20'), ('ASD', '2023-11-20')]) == [
+        {'currency': 'USD', 'date': '2023-11-20',
+         'error': 'Date not available: 2023-11-20'},
+        {'currency': 'ASD', 'date': '2023-11-20',
+         'error': 'Currency not available: ASD'},
+    ]
+
+    with pytest.raises(DateNotAvailable, match="Date not available: 2023-11-20"):
+        table.get_value('2023-11-20', 'USD')
+
+
 @pytest.fixture
 def sample_zip():
     # Create sample zip
@@ -108,3 +206,58 @@ def test_unzipper(sample_zip):
 
     assert isinstance(unzipper.get_data(), io.BytesIO)
     assert unzipper.get_data().getvalue() == b'navigare necesse est'
+
+
+def test_unzipper_file_not_found(sample_zip):
+    unzipper = Unzipper('missing.txt', sample_zip)
+
+    with pytest.raises(FileNotFoundError, match="Specified file not found: missing.txt"):
+        unzipper.get_data()
+
+
+def test_dataframe_cache_miss(tmp_path):
+    cache = DataFrameCache(str(tmp_path))
+
+    assert cache.load(DataFrameCache.key_for(b'navigare necesse est')) is None
+
+
+def test_dataframe_cache_round_trip(tmp_path, sample_dataframe):
+    pytest.importorskip('pyarrow')
+
+    cache = DataFrameCache(str(tmp_path))
+    old_key = DataFrameCache.key_for(b'old')
+    new_key = DataFrameCache.key_for(b'new')
+    cache.save(old_key, sample_dataframe)
+    cache.save(new_key, sample_dataframe)
+
+    pd.testing.assert_frame_equal(cache.load(new_key), sample_dataframe)
+
+    # Older cache files are removed
+    assert cache.load(old_key) is None
+
+
+def test_dataframe_cache_keeps_unrelated_files(tmp_path, sample_dataframe):
+    pytest.importorskip('pyarrow')
+
+    unrelated = tmp_path / 'unrelated.parquet'
+    sample_dataframe.to_parquet(unrelated)
+
+    cache = DataFrameCache(str(tmp_path))
+    cache.save(DataFrameCache.key_for(b'new'), sample_dataframe)
+
+    assert unrelated.exists()
+
+
+def test_dataframe_cache_prune_race(tmp_path, sample_dataframe):
+    pytest.importorskip('pyarrow')
+
+    cache = DataFrameCache(str(tmp_path))
+    old_key = DataFrameCache.key_for(b'old')
+    cache.save(old_key, sample_dataframe)
+
+    # Another process prunes the old file between the glob and the removal
+    with patch('tools.os.remove', side_effect=FileNotFoundError('already removed')):
+        cache.save(DataFrameCache.key_for(b'new'), sample_dataframe)
+
+    pd.testing.assert_frame_equal(
+        cache.load(DataFrameCache.key_for(b'new')), sample_dataframe)
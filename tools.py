@@ -2,10 +2,29 @@ import zipfile
 import requests
 import io
 import os
+import sys
+import glob
+import re
+import shutil
+import hashlib
 import logging
+from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+import numpy as np
 import pandas as pd
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional, without it the lookup kernel runs as plain Python
+    def njit(*args, **kwargs):
+        return lambda function: function
+
+# shared session so repeated downloads reuse pooled keep-alive connections
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=10))
+
 
 class ZipDownloader:
     """
@@ -13,13 +32,15 @@ class ZipDownloader:
 
     Args:
         url (str): The URL from which to download the file.
+        session (requests.Session, optional): The session used for the request. Defaults to the shared module session.
 
     Methods:
         get_file(): Downloads the file from the specified URL and returns its content as a BytesIO object.
     """
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, session: requests.Session | None = None):
         self.url = url
+        self.session = session or _session
 
     def get_file(self) -> io.BytesIO:
         """
@@ -33,10 +54,16 @@ class ZipDownloader:
         """
 
         try:
-            response = self._make_request()
-            self._check_response(response)
+            # closing the streamed response releases its pooled connection, also on errors
+            with self._make_request() as response:
+                self._check_response(response)
 
-            zipped_data = io.BytesIO(response.content)
+                # copy the body straight into one buffer instead of materializing response.content first
+                zipped_data = io.BytesIO()
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, zipped_data, length=1 << 20)
+
+            zipped_data.seek(0)
             logging.info(f"File successfully downloaded: {self.url}")
             return zipped_data
 
@@ -56,7 +83,7 @@ class ZipDownloader:
         """
 
         try:
-            return requests.get(self.url)
+            return self.session.get(self.url, stream=True, timeout=30)
         except requests.RequestException as e:
             logging.error(f"Error making request: {str(e)}")
             raise
@@ -126,81 +153,344 @@ class Unzipper:
         """
 
         try:
-            for info in zip_ref.infolist():
-                if info.filename == self.file_to_extract:
-                    with zip_ref.open(info) as file:
-                        file_contents = io.BytesIO(file.read())
-                        logging.info(
-                            f"File successfully unzipped: {self.file_to_extract}")
-                        return file_contents
-
-            raise FileNotFoundError(
-                f"Specified file not found: {self.file_to_extract}")
+            try:
+                with zip_ref.open(self.file_to_extract) as file:
+                    file_contents = io.BytesIO(file.read())
+            except KeyError:
+                raise FileNotFoundError(
+                    f"Specified file not found: {self.file_to_extract}")
+
+            logging.info(
+                f"File successfully unzipped: {self.file_to_extract}")
+            return file_contents
         except Exception as e:
             logging.error(f"Error extracting file: {str(e)}")
             raise
 
 
-class CurrencyExtractor:
+class DataNotAvailable(LookupError):
+    """
+    Base class for lookups that cannot be answered from the currency data.
+    """
+
+
+class CurrencyNotAvailable(DataNotAvailable):
+    """
+    Raised when the requested currency is not in the data.
+    """
+
+
+class DateNotAvailable(DataNotAvailable):
+    """
+    Raised when the requested date is not in the data.
+    """
+
+
+class ValueNotAvailable(DataNotAvailable):
     """
-    A class for extracting currency values based on a specific date from a DataFrame.
+    Raised when there is no value for the requested currency on the requested date.
+    """
+
+
+# cache keys are SHA-1 hex digests
+_CACHE_KEY_PATTERN = re.compile(r'[0-9a-f]{40}')
+
+
+class DataFrameCache:
+    """
+    A class for persisting a parsed DataFrame as Parquet, so it does not have to be re-parsed on restart.
 
     Args:
-        date (str): The date for which the currency value is to be extracted.
-        currency (str): The currency for which the value is to be extracted.
-        df (pd.DataFrame): The DataFrame containing currency data.
+        cache_dir (str): The directory where the Parquet files are stored.
 
     Methods:
-        get_value(): Extracts the currency value for the specified date and currency.
-
+        key_for(data): Returns the cache key for the given raw bytes.
+        load(key): Returns the cached DataFrame for the given key, or None if it is not cached.
+        save(key, df): Stores the DataFrame under the given key, replacing older cache files.
     """
 
-    def __init__(self, date: str, currency: str, df: pd.DataFrame):
-        self.date = date
-        self.currency = currency
-        self.df = df
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
 
-    def get_value(self) -> dict:
+    @staticmethod
+    def key_for(data: bytes) -> str:
         """
-        Extracts the currency value for the specified date and currency.
+        Returns the cache key for the given raw bytes.
+
+        Args:
+            data (bytes): The raw data the DataFrame is parsed from.
 
         Returns:
-            dict: A dictionary containing the currency, date, and value.
+            str: The SHA-1 hex digest of the data.
+        """
 
-        Raises:
-            Exception: If currency data is not available for the specified date and currency.
+        return hashlib.sha1(data).hexdigest()
+
+    def load(self, key: str) -> pd.DataFrame | None:
+        """
+        Returns the cached DataFrame for the given key.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            pd.DataFrame | None: The cached DataFrame, or None if it is not cached or cannot be read.
         """
 
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
         try:
-            self._validate_inputs()
+            df = pd.read_parquet(path)
+            logging.info(f"DataFrame loaded from cache: {path}")
+            return df
+        except Exception as e:
+            logging.warning(f"Could not read cache file {path}: {str(e)}")
+            return None
+
+    def save(self, key: str, df: pd.DataFrame):
+        """
+        Stores the DataFrame under the given key and removes older cache files.
+        Failures are logged and ignored, so a missing Parquet engine only disables the cache.
 
-            result = self.df.loc[self.df['Date']
-                                 == self.date, self.currency].values
-            if pd.isna(result[0]):
-                raise Exception(
-                    f"Currency data not available: {self.currency}, {self.date}")
+        Args:
+            key (str): The cache key.
+            df (pd.DataFrame): The DataFrame to store.
+        """
 
-            result_dict = {
-                'currency': self.currency,
-                'date': self.date,
-                'value': result[0]
-            }
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
 
-            return result_dict
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_parquet(tmp_path, compression='zstd')
+            os.replace(tmp_path, path)
+            logging.info(f"DataFrame saved to cache: {path}")
         except Exception as e:
-            logging.error(f"An error occurred: {str(e)}")
-            raise
+            logging.warning(f"Could not write cache file {path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        for old_path in glob.glob(os.path.join(self.cache_dir, '*.parquet')):
+            # only prune files named like a cache key, never unrelated Parquet files
+            stem = os.path.basename(old_path)[:-len('.parquet')]
+            if old_path == path or not _CACHE_KEY_PATTERN.fullmatch(stem):
+                continue
+
+            try:
+                os.remove(old_path)
+            except OSError as e:
+                # another process may have pruned it already, a stale file must not fail the load
+                logging.warning(f"Could not remove cache file {old_path}: {str(e)}")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+
+@njit(cache=True)
+def _lookup_kernel(dates: np.ndarray, values: np.ndarray, key: int, col: int) -> tuple[int, float]:
+    """
+    Returns the (row, value) for the date key and column, with row -1 if the date is not available.
+    """
+
+    row = np.searchsorted(dates, key)
+    if row >= dates.size or dates[row] != key:
+        return -1, np.nan
+
+    return row, values[row, col]
+
+
+class CurrencyTable:
+    """
+    A class holding the currency values as NumPy arrays, so lookups do not go through pandas.
+
+    Dates are stored as sorted YYYYMMDD integers and the values as a (dates x currencies) float array.
+    The version attribute is a SHA-1 of the data, so tables with the same data have the same version.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing currency data, indexed by a DatetimeIndex.
+
+    Methods:
+        get_value(date, currency): Returns the value for the specified date and currency.
+        get_values(pairs): Returns the values for a list of (currency, date) pairs in one vectorized lookup.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        # the loader already sorts by date, so this only sorts DataFrames built elsewhere
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+
+        index = df.index
+        dates = index.year * 10000 + index.month * 100 + index.day
+
+        # contiguous arrays keep the binary search and the kernel on flat memory
+        self.dates = np.ascontiguousarray(dates, dtype=np.int64)
+        self.values = np.ascontiguousarray(df.to_numpy(dtype=np.float64))
+        # one shared string object per currency code, whichever table it comes from
+        currencies = [sys.intern(str(currency)) for currency in df.columns]
+        self.col_idx = {currency: i for i, currency in enumerate(currencies)}
+
+        # identifies the data, so HTTP caches can tell a refreshed table apart
+        digest = hashlib.sha1(','.join(currencies).encode())
+        digest.update(self.dates.tobytes())
+        digest.update(self.values.tobytes())
+        self.version = digest.hexdigest()
+
+        # compile the kernel now rather than on the first request
+        if self.dates.size:
+            _lookup_kernel(self.dates, self.values, int(self.dates[0]), 0)
+
+    def get_value(self, date: str, currency: str) -> float:
+        """
+        Returns the value for the specified date and currency.
+
+        Args:
+            date (str): The date in YYYY-MM-DD format.
+            currency (str): The currency code.
+
+        Returns:
+            float: The currency value.
+
+        Raises:
+            CurrencyNotAvailable: If the currency is not available.
+            DateNotAvailable: If the date is not available.
+            ValueNotAvailable: If there is no value for the currency on the date.
+        """
 
-    def _validate_inputs(self):
+        col = self.col_idx.get(currency)
+        if col is None:
+            raise CurrencyNotAvailable(f"Currency not available: {currency}")
+
+        row, value = _lookup_kernel(self.dates, self.values, self._date_key(date), col)
+        if row < 0:
+            raise DateNotAvailable(f"Date not available: {date}")
+
+        # NaN is the only value not equal to itself, a plain float compare without a NumPy call
+        if value != value:
+            raise ValueNotAvailable(
+                f"Currency data not available: {currency}, {date}")
+
+        return float(value)
+
+    def get_values(self, pairs: list[tuple[str, str]]) -> list[dict]:
+        """
+        Returns the values for a list of (currency, date) pairs in one vectorized lookup.
+
+        Args:
+            pairs (list[tuple[str, str]]): The (currency, date) pairs, dates in YYYY-MM-DD format.
+
+        Returns:
+            list[dict]: One dictionary per pair containing the currency, date, and either the value
+            or an error message if the value is not available.
+        """
+
+        if not pairs:
+            return []
+
+        cols = np.array([self.col_idx.get(currency, -1) for currency, _ in pairs], dtype=np.intp)
+        keys = np.empty(len(pairs), dtype=np.int64)
+        for i, (_, date) in enumerate(pairs):
+            try:
+                keys[i] = self._date_key(date)
+            except DateNotAvailable:
+                keys[i] = -1
+
+        if self.dates.size:
+            rows = np.minimum(np.searchsorted(self.dates, keys), self.dates.size - 1)
+            found = self.dates[rows] == keys
+            values = self.values[rows, cols]
+        else:
+            # no dates at all, every known currency gets a date error like in get_value
+            found = np.zeros(len(pairs), dtype=bool)
+            values = np.full(len(pairs), np.nan)
+
+        results = []
+        for (currency, date), col, is_found, value in zip(pairs, cols.tolist(), found.tolist(), values.tolist()):
+            result = {'currency': currency, 'date': date}
+            if col < 0:
+                result['error'] = f"Currency not available: {currency}"
+            elif not is_found:
+                result['error'] = f"Date not available: {date}"
+            elif value != value:
+                result['error'] = f"Currency data not available: {currency}, {date}"
+            else:
+                result['value'] = value
+            results.append(result)
+
+        return results
+
+    @staticmethod
+    def _date_key(date: str) -> int:
         """
-        Validates the inputs by checking if the currency and date are available in the DataFrame.
+        Converts a YYYY-MM-DD date into its YYYYMMDD integer key.
 
         Raises:
-            Exception: If currency or date is not available in the DataFrame.
+            DateNotAvailable: If the date is not in YYYY-MM-DD format.
+        """
+
+        if len(date) != 10 or date[4] != '-' or date[7] != '-':
+            raise DateNotAvailable(f"Date not available: {date}")
+
+        digits = date[:4] + date[5:7] + date[8:]
+        if not (digits.isascii() and digits.isdigit()):
+            raise DateNotAvailable(f"Date not available: {date}")
+
+        return int(digits)
+
+
+def extract(date: str, currency: str, table: CurrencyTable) -> dict:
+    """
+    Extracts the currency value for the specified date and currency.
+
+    Args:
+        date (str): The date for which the currency value is to be extracted.
+        currency (str): The currency for which the value is to be extracted.
+        table (CurrencyTable): The table containing currency data.
+
+    Returns:
+        dict: A dictionary containing the currency, date, and value.
+
+    Raises:
+        DataNotAvailable: If currency data is not available for the specified date and currency.
+    """
+
+    return {
+        'currency': currency,
+        'date': date,
+        'value': table.get_value(date, currency)
+    }
+
+
+@dataclass(slots=True)
+class CurrencyExtractor:
+    """
+    A thin wrapper around extract() for a fixed date, currency and CurrencyTable.
+
+    Args:
+        date (str): The date for which the currency value is to be extracted.
+        currency (str): The currency for which the value is to be extracted.
+        table (CurrencyTable): The table containing currency data.
+
+    Methods:
+        get_value(): Extracts the currency value for the specified date and currency.
+
+    """
+
+    date: str
+    currency: str
+    table: CurrencyTable
+
+    def get_value(self) -> dict:
         """
+        Extracts the currency value for the specified date and currency.
+
+        Returns:
+            dict: A dictionary containing the currency, date, and value.
 
-        if self.currency not in self.df.columns.values or self.currency == 'Date':
-            raise Exception(f"Currency not available: {self.currency}")
+        Raises:
+            DataNotAvailable: If currency data is not available for the specified date and currency.
+        """
 
-        if self.date not in self.df['Date'].values:
-            raise Exception(f"Date not available: {self.date}")
+        return extract(self.date, self.currency, self.table)
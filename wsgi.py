@@ -0,0 +1,3 @@
+from currency_api import app
+
+__all__ = ['app']